@@ -13,22 +13,168 @@ import json
 import os
 import subprocess
 import threading
+import heapq
+import itertools
+import glob
+import signal
+import mmap
+import struct
+import uuid
 from collections import deque
+from datetime import datetime, timedelta
 
 SOCKET_PATH = "/home/appuser/FieldStation42/runtime/channel.socket"
 LOG_PATH = "/home/appuser/FieldStation42/runtime/ir_mapper.log"
+CADENCE_PATH = "/home/appuser/FieldStation42/runtime/ir_cadence.json"
+CONFS_DIR = "/home/appuser/FieldStation42/confs"
+SCHEDULE_PATH = "/home/appuser/FieldStation42/runtime/ir_schedule.json"
+STATE_PATH = "/home/appuser/FieldStation42/runtime/ir_state.bin"
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+MPV_SHADERS_DIR = "/home/appuser/.config/mpv/shaders"
+
+# mpv keys (see files/mpv/input.conf.j2) that jump straight to a shader or toggle it off.
+# The hidden shaders aren't in the c/z cycle, so after those we can't know our position.
+SHADER_JUMP_KEYS = {
+    'h': "",                 # Shaders off, the start of the cycle
+    'b': "hue_shift.glsl",
+    'n': "underwater.glsl",
+    'd': None,               # hidden/8bit.glsl
+    'm': None,               # hidden/bardo.glsl
+}
+SHADER_UNKNOWN = 0xFF
+
+# Station conf day keys, in datetime.weekday() order
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
 
 # Valid channels - super simple array for now
 VALID_CHANNELS = [1, 2, 3, 8, 9, 13]
 
+# Event scheduling: lower runs first. Digits share the channel tier so number entry stays in order.
+PRIORITY_CHANNEL = 0
+PRIORITY_CONTROL = 1
+PRIORITY_COSMETIC = 2
+EVENT_PRIORITIES = {
+    "CHANNEL_UP": PRIORITY_CHANNEL,
+    "CHANNEL_DOWN": PRIORITY_CHANNEL,
+    "POWER": PRIORITY_CHANNEL,
+    **{f"DIGIT_{i}": PRIORITY_CHANNEL for i in range(10)},
+    "EFFECT_NEXT": PRIORITY_COSMETIC,
+    "EFFECT_PREV": PRIORITY_COSMETIC,
+    "DIGITAL_ANALOG": PRIORITY_COSMETIC,
+    "INFO": PRIORITY_COSMETIC,
+    "MENU": PRIORITY_COSMETIC,
+    # Timed automation is ordered with channel input, never around it
+    "SCHEDULED": PRIORITY_CHANNEL,
+    "RESTORE_CHANNEL": PRIORITY_CHANNEL,
+}
+# Seconds an event may wait in the queue before it's a phantom press
+EVENT_MAX_AGE = {
+    PRIORITY_CHANNEL: 2.0,
+    PRIORITY_CONTROL: 1.0,
+    PRIORITY_COSMETIC: 0.75,
+}
+# Not input, so never stale and never shed: a missed signoff or auto-tune would not recur for a week
+# (and a lost warm-restart re-tune would leave the player on its default station)
+UNSHEDDABLE_EVENTS = {"SCHEDULED", "RESTORE_CHANNEL"}
+# Events where a newer press makes a queued one pointless
+COLLAPSE_KINDS = {
+    "INFO": "overlay",
+    "MENU": "overlay",
+}
+
+def current_boot_id():
+    """Kernel boot id, so a snapshot from before a reboot is not mistaken for a warm restart"""
+    try:
+        with open(BOOT_ID_PATH) as f:
+            return uuid.UUID(f.read().strip()).bytes
+    except Exception:
+        return bytes(16)
+
+class StateSnapshot:
+    """Fixed-layout mapper state kept in an mmap'd file for instant warm restarts"""
+
+    # magic, version, brightness, channel, shader cycle position, last command sequence number, boot id
+    LAYOUT = struct.Struct("<4sBBHBxxxQ16s")
+    MAGIC = b"FS42"
+    VERSION = 3
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.mm = None
+        self.lock = threading.Lock()
+        self.brightness = 7
+        self.channel = VALID_CHANNELS[0]
+        self.shader = 0
+        self.seq = 0
+        self.boot_id = current_boot_id()
+
+    def open(self):
+        """Map the snapshot file and restore it; returns True for a warm restart (same boot).
+        After a reboot only brightness and the sequence number carry over."""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != self.LAYOUT.size:
+                    os.ftruncate(fd, self.LAYOUT.size)
+                self.mm = mmap.mmap(fd, self.LAYOUT.size)
+            finally:
+                os.close(fd)  # The mapping stays valid without the descriptor
+        except Exception as e:
+            print(f"❌ Failed to map state snapshot: {e}")
+            return False
+
+        magic, version, brightness, channel, shader, seq, boot_id = self.LAYOUT.unpack_from(self.mm)
+        if magic != self.MAGIC or version != self.VERSION:
+            self._write()
+            return False
+        self.brightness, self.seq = brightness, seq
+        if boot_id != self.boot_id or not any(boot_id):
+            # Cold boot: everything restarts from defaults, so start clean too
+            print(f"💾 Cold boot: keeping brightness {brightness}, seq {seq}")
+            self._write()
+            return False
+        self.channel, self.shader = channel, shader
+        print(f"💾 Restored state: channel {channel}, brightness {brightness}, shader {shader}, seq {seq}")
+        return True
+
+    def _write(self):
+        """Pack current fields into the mapping (called with lock held or before threads start).
+        Page cache writes survive pkill, so no msync per change."""
+        if self.mm:
+            self.LAYOUT.pack_into(self.mm, 0, self.MAGIC, self.VERSION,
+                                  self.brightness, self.channel, self.shader, self.seq, self.boot_id)
+
+    def update(self, **fields):
+        """Change fields and persist them immediately"""
+        with self.lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._write()
+
+    def next_seq(self):
+        """Allocate the sequence number for the next command"""
+        with self.lock:
+            self.seq += 1
+            self._write()
+            return self.seq
+
+    def close(self):
+        if self.mm:
+            self.mm.flush()
+            self.mm.close()
+            self.mm = None
+
 class DisplayController:
     """Handles 7-segment display communication via serial"""
 
-    def __init__(self, display_device=None, baudrate=9600):
+    def __init__(self, display_device=None, baudrate=9600, state=None, self_test=True):
         self.display_serial = None
         self.display_device = display_device
         self.baudrate = baudrate
         self.lock = threading.Lock()
+        self.state = state
+        self.self_test = self_test
         
         if display_device:
             self.connect_display()
@@ -40,10 +186,11 @@ class DisplayController:
                 self.display_serial = serial.Serial(self.display_device, self.baudrate, timeout=1)
                 time.sleep(0.1)  # Give display time to initialize
                 print(f"📟 Display connected on {self.display_device}")
-                # Test the display
-                self.display_text("INIT")
-                time.sleep(0.5)
-                self.clear_display()
+                # Test the display (skipped on warm restart so the channel shows at once)
+                if self.self_test:
+                    self.display_text("INIT")
+                    time.sleep(0.5)
+                    self.clear_display()
         except Exception as e:
             print(f"❌ Failed to connect to display: {e}")
             self.display_serial = None
@@ -87,6 +234,8 @@ class DisplayController:
     def set_brightness(self, level):
         """Set brightness (0-7)"""
         level = max(0, min(7, int(level)))  # Clamp to 0-7
+        if self.state:
+            self.state.update(brightness=level)
         return self.send_display_command(f"DISP:BRT:{level}")
     
     def turn_on(self):
@@ -97,8 +246,73 @@ class DisplayController:
         """Turn display off"""
         return self.send_display_command("DISP:OFF")
 
+class DigitCadence:
+    """Learns a per-remote digit timeout from observed inter-digit intervals"""
+
+    def __init__(self, default_timeout=1.5, min_timeout=0.6, max_timeout=3.0,
+                 percentile=90, margin=0.35, history=50, min_samples=5, path=None):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.percentile = percentile
+        self.margin = margin
+        self.history = history
+        self.min_samples = min_samples
+        self.path = path
+        self.intervals = {}  # "PROTOCOL/ADDRESS" -> deque of seconds between digits
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Restore learned intervals from disk"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            for remote, samples in data.items():
+                self.intervals[remote] = deque((float(s) for s in samples), maxlen=self.history)
+            print(f"⏱️  Loaded digit cadence for {len(self.intervals)} remote(s) from {self.path}")
+        except Exception as e:
+            print(f"❌ Failed to load digit cadence: {e}")
+
+    def save(self):
+        """Persist learned intervals so the timeout survives restarts"""
+        if not self.path:
+            return
+        try:
+            with self.lock:
+                data = {remote: list(samples) for remote, samples in self.intervals.items()}
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"❌ Failed to save digit cadence: {e}")
+
+    def record(self, remote, interval):
+        """Add one observed inter-digit interval for a remote"""
+        if remote is None or interval <= 0:
+            return
+        with self.lock:
+            samples = self.intervals.setdefault(remote, deque(maxlen=self.history))
+            samples.append(interval)
+
+    def timeout_for(self, remote):
+        """High percentile of the remote's intervals plus margin, clamped to bounds"""
+        with self.lock:
+            samples = sorted(self.intervals.get(remote, ()))
+        if len(samples) < self.min_samples:
+            return self.default_timeout
+        idx = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        timeout = samples[idx] + self.margin
+        return max(self.min_timeout, min(self.max_timeout, timeout))
+
 class ChannelDialer:
-    def __init__(self, digit_timeout=1.5, easter_egg_timeout=1.5, display_controller=None):
+    # A digit arriving this soon after a commit most likely belonged to the previous number
+    SPLIT_WINDOW = 0.6
+
+    def __init__(self, digit_timeout=1.5, easter_egg_timeout=1.5, display_controller=None, cadence=None, state=None):
         self.digit_queue = deque()
         self.digit_timeout = digit_timeout
         self.easter_egg_timeout = easter_egg_timeout
@@ -106,7 +320,22 @@ class ChannelDialer:
         self.timer = None
         self.lock = threading.Lock()
         self.display = display_controller
-        self.current_channel = 1  # Track current channel, default to 1
+        self.state = state
+        # Track current channel, default to 1 unless restored from the snapshot
+        self._current_channel = state.channel if state else 1
+        self.cadence = cadence
+
+        # Which remote is dialing, and dial statistics for the logs
+        self.remote = None
+        self.pressed_at = None
+        self.sequence_remote = None
+        self.sequence_start = 0
+        self.last_commit_time = 0
+        self.last_commit_digit_time = 0
+        self.last_commit_remote = None
+        self.dials = 0
+        self.splits = 0
+        self.total_latency = 0.0
         
         # Easter egg mappings - add more as needed
         self.easter_eggs = {
@@ -120,12 +349,57 @@ class ChannelDialer:
             "80085": self.fun_mode,  # Support for longer sequences
         }
     
+    @property
+    def current_channel(self):
+        return self._current_channel
+
+    @current_channel.setter
+    def current_channel(self, channel):
+        self._current_channel = channel
+        if self.state:
+            self.state.update(channel=channel)
+
+    def set_remote(self, protocol, address, pressed_at=None):
+        """Remember which remote sent the next digit, and when it was pressed"""
+        self.remote = f"{protocol}/{address}" if protocol and address else None
+        self.pressed_at = pressed_at
+
+    def current_timeout(self):
+        """Digit timeout for the remote currently dialing"""
+        if self.cadence:
+            return self.cadence.timeout_for(self.sequence_remote)
+        return self.digit_timeout
+
+    def _track_cadence(self, now):
+        """Feed inter-digit timing to the cadence model (called with lock held)"""
+        if self.digit_queue:
+            if self.remote == self.sequence_remote and self.cadence:
+                self.cadence.record(self.remote, now - self.last_digit_time)
+            return
+
+        # First digit of a new sequence
+        self.sequence_remote = self.remote
+        self.sequence_start = now
+        if (self.remote is not None and self.remote == self.last_commit_remote
+                and now - self.last_commit_time < self.SPLIT_WINDOW):
+            # Timeout fired mid-number: learn the interval we cut off
+            self.splits += 1
+            interval = now - self.last_commit_digit_time
+            print(f"⏱️  Probable split entry on {self.remote}: {interval:.2f}s after previous digit")
+            if self.cadence:
+                self.cadence.record(self.remote, interval)
+
     def add_digit(self, digit):
         """Add a digit to the queue and manage timing"""
         try:
             with self.lock:
+                # Use the press time, not when the worker got here, so queued digits
+                # don't read as rapid typing
+                now = self.pressed_at or time.time()
+                self.pressed_at = None
+                self._track_cadence(now)
                 self.digit_queue.append(str(digit))
-                self.last_digit_time = time.time()
+                self.last_digit_time = now
                 
                 # Show current digit sequence on display
                 current_sequence = ''.join(self.digit_queue)
@@ -155,7 +429,8 @@ class ChannelDialer:
                     return
                 
                 # Set new timer for regular channel processing
-                self.timer = threading.Timer(self.digit_timeout, self._process_channel)
+                delay = max(0.0, self.current_timeout() - (time.time() - now))
+                self.timer = threading.Timer(delay, self._process_channel)
                 self.timer.start()
         except Exception as e:
             print(f"Add digit error: {e}")
@@ -195,6 +470,7 @@ class ChannelDialer:
                     return
                 
                 channel_str = ''.join(self.digit_queue)
+                self._record_commit()
                 
                 # Check for Easter eggs one more time
                 if channel_str in self.easter_eggs:
@@ -234,6 +510,21 @@ class ChannelDialer:
             except:
                 pass
     
+    def _record_commit(self):
+        """Log dial-to-tune latency and split rate (called with lock held)"""
+        now = time.time()
+        latency = now - self.sequence_start
+        self.dials += 1
+        self.total_latency += latency
+        self.last_commit_time = now
+        self.last_commit_digit_time = self.last_digit_time
+        self.last_commit_remote = self.sequence_remote
+        print(f"⏱️  Dial on {self.sequence_remote or 'unknown remote'}: latency {latency:.2f}s "
+              f"(avg {self.total_latency / self.dials:.2f}s), timeout {self.current_timeout():.2f}s, "
+              f"splits {self.splits}/{self.dials}")
+        if self.cadence:
+            self.cadence.save()
+
     def tune_to_channel(self, channel):
         """Tune to specific channel number with validation"""
         print(f"📺 Attempting to tune to channel {channel}")
@@ -320,7 +611,7 @@ class ChannelDialer:
                 self.display.display_text("911!")
             # Safely try to send key to mpv
             try:
-                send_key_to_mpv('c')  # Could trigger special emergency feed
+                cycle_shader(1)  # Could trigger special emergency feed
             except Exception as e:
                 print(f"Easter egg mpv command failed: {e}")
         except Exception as e:
@@ -387,12 +678,384 @@ class ChannelDialer:
         except Exception as e:
             print(f"Fun mode error: {e}")
 
+class EventQueue:
+    """Bounded priority queue between the serial reader and the event handlers"""
+
+    def __init__(self, maxsize=16, stats_every=25, sequence_gap=3.0):
+        self.maxsize = maxsize
+        self.stats_every = stats_every
+        self.sequence_gap = sequence_gap
+        self.heap = []  # [priority, seq, received, deadline, event_name, args, alive]
+        self.live = 0
+        self.pending_kinds = {}  # collapse kind -> queued entry
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+
+        self.handled = 0
+        self.dropped_stale = 0
+        self.dropped_full = 0
+        self.collapsed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def put(self, event_name, *args, received=None):
+        """Queue an event, shedding superseded or lowest-priority work when full"""
+        received = received or time.time()
+        priority = EVENT_PRIORITIES.get(event_name, PRIORITY_CONTROL)
+        unsheddable = event_name in UNSHEDDABLE_EVENTS
+        deadline = float('inf') if unsheddable else received + EVENT_MAX_AGE[priority]
+        entry = [priority, next(self.seq), received, deadline, event_name, args, True]
+
+        with self.cond:
+            kind = COLLAPSE_KINDS.get(event_name)
+            old = self.pending_kinds.get(kind) if kind else None
+            if old is not None and not old[6]:
+                old = None
+
+            # A collapse frees the superseded slot, so only shed when nothing collapses.
+            # Unsheddable events may briefly exceed the bound rather than be lost.
+            if self.live >= self.maxsize and old is None and not unsheddable:
+                # Shed the oldest event of the lowest priority, unless the new one ranks below it
+                victim = max((e for e in self.heap if e[6] and e[4] not in UNSHEDDABLE_EVENTS),
+                             key=lambda e: (e[0], -e[1]), default=None)
+                if (victim is None or victim[0] < priority
+                        or (victim[0] == priority and priority == PRIORITY_CHANNEL)):
+                    # Never reorder channel-tier input; drop the newcomer instead
+                    self.dropped_full += 1
+                    print(f"🚮 Queue full, dropped {event_name}")
+                    return False
+                self._kill(victim)
+                self.dropped_full += 1
+                print(f"🚮 Queue full, dropped {victim[4]}")
+
+            if old is not None:
+                self._kill(old)
+                self.collapsed += 1
+                print(f"🗜️  Collapsed queued {old[4]} into {event_name}")
+
+            heapq.heappush(self.heap, entry)
+            self.live += 1
+            # Only track entries that actually made it onto the heap
+            if kind:
+                self.pending_kinds[kind] = entry
+            self.cond.notify()
+            return True
+
+    def _kill(self, entry):
+        """Lazily remove an entry from the heap (called with cond held)"""
+        entry[6] = False
+        self.live -= 1
+
+    def get(self):
+        """Block for the next fresh event, dropping any that went stale"""
+        with self.cond:
+            while True:
+                while not self.live:
+                    self.cond.wait()
+                entry = heapq.heappop(self.heap)
+                if not entry[6]:
+                    continue
+                self.live -= 1
+                kind = COLLAPSE_KINDS.get(entry[4])
+                if kind and self.pending_kinds.get(kind) is entry:
+                    del self.pending_kinds[kind]
+                now = time.time()
+                age = now - entry[2]
+                if now > entry[3]:
+                    self.dropped_stale += 1
+                    print(f"⌛ Dropped stale {entry[4]} ({age:.2f}s old)")
+                    if entry[4].startswith("DIGIT_"):
+                        # Part of a number is worse than none: the rest would tune a phantom channel
+                        self._drop_digits_after(entry)
+                        return "CLEAR_DIGITS", (), age, entry[2]
+                    continue
+                return entry[4], entry[5], age, entry[2]
+
+    def _drop_digits_after(self, stale):
+        """Drop the queued digits that follow a stale one (called with cond held)"""
+        later = sorted((e for e in self.heap if e[6] and e[0] == stale[0] and e[1] > stale[1]),
+                       key=lambda e: e[1])
+        previous = stale
+        for entry in later:
+            # A longer pause than any digit timeout starts a new number, which is kept
+            if not entry[4].startswith("DIGIT_") or entry[2] - previous[2] > self.sequence_gap:
+                break
+            previous = entry
+            self._kill(entry)
+            self.dropped_stale += 1
+            print(f"⌛ Dropped {entry[4]} from the same stale sequence")
+
+    def run(self, handler):
+        """Worker loop: execute queued events with the given handler"""
+        while True:
+            event_name, args, age, received = self.get()
+            try:
+                # Pass the press time along so timing-sensitive handlers ignore queueing delay
+                handler(event_name, *args, received=received)
+            except Exception as e:
+                print(f"Handler error for {event_name}: {e}")
+            self.handled += 1
+            self.total_latency += age
+            self.max_latency = max(self.max_latency, age)
+            if self.handled % self.stats_every == 0:
+                self.log_stats()
+
+    def log_stats(self):
+        """Print drop and latency counters"""
+        avg = self.total_latency / self.handled if self.handled else 0.0
+        print(f"📊 Events: handled {self.handled}, stale {self.dropped_stale}, full {self.dropped_full}, "
+              f"collapsed {self.collapsed}, queue latency avg {avg * 1000:.0f}ms max {self.max_latency * 1000:.0f}ms")
+
+    def start(self, handler):
+        """Run the worker on a daemon thread"""
+        worker = threading.Thread(target=self.run, args=(handler,), daemon=True, name="ir-events")
+        worker.start()
+        return worker
+
+class ScheduleRule:
+    """One weekly timed action, e.g. blank the display at 02:00 on channel 1"""
+
+    # Actions whose latest past occurrence describes the current state
+    STATEFUL = {"brightness": "brightness", "display_off": "display", "display_on": "display"}
+
+    def __init__(self, action, hour, minute=0, days=None, channel=None, value=None, source="rules"):
+        self.action = action
+        self.hour = int(hour)
+        self.minute = int(minute)
+        self.days = set(range(7)) if days is None else set(days)
+        self.channel = channel
+        self.value = value
+        self.source = source
+
+    def next_fire(self, after):
+        """First occurrence strictly after the given datetime"""
+        base = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        for offset in range(8):
+            candidate = base + timedelta(days=offset)
+            if candidate > after and candidate.weekday() in self.days:
+                return candidate
+        return None
+
+    def prev_fire(self, before):
+        """Latest occurrence at or before the given datetime"""
+        base = before.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        for offset in range(8):
+            candidate = base - timedelta(days=offset)
+            if candidate <= before and candidate.weekday() in self.days:
+                return candidate
+        return None
+
+    def __repr__(self):
+        target = f" ch{self.channel}" if self.channel is not None else ""
+        value = f"={self.value}" if self.value is not None else ""
+        return f"{self.action}{value}{target}@{self.hour:02d}:{self.minute:02d} ({self.source})"
+
+def compile_conf_rules(confs_dir):
+    """Turn station conf signoff events into display rules.
+    Blank at each signoff hour, show the channel again at the next hour with programming."""
+    rules = []
+    for conf_path in sorted(glob.glob(os.path.join(confs_dir, "*.json"))):
+        try:
+            with open(conf_path) as f:
+                station = json.load(f).get("station_conf", {})
+        except Exception as e:
+            print(f"❌ Failed to read {conf_path}: {e}")
+            continue
+        channel = station.get("channel_number")
+        if channel is None:
+            continue
+
+        # Flatten the week into 168 hourly slots so sign-on can wrap past midnight and Sunday
+        week = [station.get(day, {}).get(str(hour)) for day in WEEKDAYS for hour in range(24)]
+        name = os.path.basename(conf_path)
+        for slot, entry in enumerate(week):
+            if not entry or entry.get("event") != "signoff":
+                continue
+            rules.append(ScheduleRule("display_off", slot % 24, days=[slot // 24], channel=channel, source=name))
+            for step in range(1, len(week)):
+                later = (slot + step) % len(week)
+                if week[later] and "tags" in week[later]:
+                    rules.append(ScheduleRule("display_on", later % 24, days=[later // 24], channel=channel, source=name))
+                    break
+    return rules
+
+def load_user_rules(rules_path):
+    """Load user rules: {"rules": [{"at": "23:00", "action": "brightness", "value": 1, "days": ["friday"]}]}"""
+    if not rules_path or not os.path.exists(rules_path):
+        return []
+    rules = []
+    try:
+        with open(rules_path) as f:
+            entries = json.load(f).get("rules", [])
+    except Exception as e:
+        print(f"❌ Failed to read schedule rules: {e}")
+        return []
+    for entry in entries:
+        try:
+            hour, minute = entry["at"].split(":")
+            days = [WEEKDAYS.index(d.lower()) for d in entry["days"]] if "days" in entry else None
+            rules.append(ScheduleRule(entry["action"], hour, minute, days=days,
+                                      channel=entry.get("channel"), value=entry.get("value"),
+                                      source=os.path.basename(rules_path)))
+        except Exception as e:
+            print(f"❌ Bad schedule rule {entry}: {e}")
+    return rules
+
+class Scheduler:
+    """Runs timed actions from a min-heap of next-fire times with a single sleeping waiter"""
+
+    def __init__(self, dialer, display=None, confs_dir=CONFS_DIR, rules_path=SCHEDULE_PATH, clock=datetime.now,
+                 dispatch=None):
+        self.dialer = dialer
+        self.display = display
+        # How fired rules reach execute(); the mapper routes them through the event queue
+        # so they run on the same worker as remote input. Defaults to inline for tests.
+        self.dispatch = dispatch or self.execute
+        self.confs_dir = confs_dir
+        self.rules_path = rules_path
+        self.clock = clock
+        self.rules = []
+        self.heap = []  # (fire_time, seq, rule)
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.signature = None
+        self.stopped = False
+
+    def _signature(self):
+        """mtimes of every input, so we only recompile when something changed"""
+        paths = sorted(glob.glob(os.path.join(self.confs_dir, "*.json")))
+        if self.rules_path and os.path.exists(self.rules_path):
+            paths.append(self.rules_path)
+        return tuple((p, os.path.getmtime(p)) for p in paths)
+
+    def reload(self, force=False):
+        """Recompile rules and rebuild the heap if the confs or rules changed"""
+        signature = self._signature()
+        if not force and signature == self.signature:
+            return False
+        rules = compile_conf_rules(self.confs_dir) + load_user_rules(self.rules_path)
+        now = self.clock()
+        with self.cond:
+            self.signature = signature
+            self.rules = rules
+            self.heap = [(rule.next_fire(now), next(self.seq), rule) for rule in rules]
+            self.heap = [entry for entry in self.heap if entry[0] is not None]
+            heapq.heapify(self.heap)
+            self.cond.notify()
+        print(f"🗓️  Scheduler loaded {len(rules)} rule(s)"
+              + (f", next: {self.heap[0][2]} at {self.heap[0][0]:%a %H:%M}" if self.heap else ""))
+        return True
+
+    def catch_up(self):
+        """Apply the latest past state (brightness, blanking) so a restart mid-signoff looks right"""
+        now = self.clock()
+        latest = {}
+        for rule in self.rules:
+            kind = ScheduleRule.STATEFUL.get(rule.action)
+            if not kind or not self._applies(rule):
+                continue
+            fired = rule.prev_fire(now)
+            if fired and (kind not in latest or fired > latest[kind][0]):
+                latest[kind] = (fired, rule)
+        for fired, rule in latest.values():
+            print(f"🗓️  Catching up: {rule}")
+            self.dispatch(rule)
+
+    def _applies(self, rule):
+        """Display rules bound to a channel only act while that channel is on"""
+        if rule.action == "tune" or rule.channel is None:
+            return True
+        return rule.channel == self.dialer.current_channel
+
+    def run_due(self):
+        """Fire every rule whose time has come and reschedule it; returns the fired rules"""
+        now = self.clock()
+        due = []
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                _, _, rule = heapq.heappop(self.heap)
+                due.append(rule)
+                next_time = rule.next_fire(now)
+                if next_time:
+                    heapq.heappush(self.heap, (next_time, next(self.seq), rule))
+        # Actions touch serial devices and may sleep, so hand them off outside the lock
+        for rule in due:
+            print(f"🗓️  Firing {rule}")
+            self.dispatch(rule)
+        return due
+
+    def next_delay(self):
+        """Seconds until the earliest rule, or None to sleep until notified"""
+        with self.cond:
+            if not self.heap:
+                return None
+            return max(0.0, (self.heap[0][0] - self.clock()).total_seconds())
+
+    def execute(self, rule):
+        """Perform one rule's action (on the event worker when dispatched through the queue)"""
+        if not self._applies(rule):
+            return
+        try:
+            if rule.action == "brightness":
+                if self.display:
+                    self.display.set_brightness(rule.value)
+            elif rule.action == "display_off":
+                if self.display:
+                    self.display.clear_display()
+            elif rule.action == "display_on":
+                if self.display:
+                    self.display.turn_on()
+                    self.display.display_number(self.dialer.current_channel)
+            elif rule.action == "tune":
+                self.dialer.clear_queue()
+                self.dialer.tune_to_channel(int(rule.channel if rule.channel is not None else rule.value))
+            else:
+                print(f"⚠️  Unknown scheduled action: {rule.action}")
+        except Exception as e:
+            print(f"Scheduled action error for {rule}: {e}")
+
+    def run(self):
+        """Waiter loop: sleep until the next fire time or a reload request, never poll"""
+        while not self.stopped:
+            self.reload()
+            self.run_due()
+            with self.cond:
+                if self.stopped:
+                    break
+                self.cond.wait(self.next_delay())
+
+    def request_reload(self, *_):
+        """Wake the waiter to re-check the confs (wired to SIGHUP)"""
+        with self.cond:
+            self.signature = None
+            self.cond.notify()
+
+    def start(self):
+        """Load rules, catch up on current state and start the waiter thread"""
+        self.reload(force=True)
+        self.catch_up()
+        waiter = threading.Thread(target=self.run, daemon=True, name="ir-scheduler")
+        waiter.start()
+        return waiter
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
 # Global instances
 display_controller = None
 channel_dialer = None
+event_queue = None
+scheduler = None
+state_snapshot = None
+shader_order = [""]
 
 def write_json_to_socket(data):
     try:
+        if state_snapshot:
+            # Sequence continues across restarts so the player can order commands
+            data = dict(data, seq=state_snapshot.next_seq())
         json_str = json.dumps(data)
         with open(SOCKET_PATH, 'w') as f:
             f.write(json_str)
@@ -400,15 +1063,83 @@ def write_json_to_socket(data):
     except Exception as e:
         print(f"Error writing to socket: {e}")
 
-def send_key_to_mpv(key):
+def find_mpv_window():
+    """Window id of the player's mpv, raising if it isn't up yet"""
+    return subprocess.check_output(
+        ['xdotool', 'search', '--onlyvisible', '--class', 'mpv'],
+        env={'DISPLAY': ':0'}
+    ).decode().strip().split('\n')[0]
+
+def send_key_to_mpv(key, repeat=1):
     try:
-        window_id = subprocess.check_output(
-            ['xdotool', 'search', '--onlyvisible', '--class', 'mpv'],
-            env={'DISPLAY': ':0'}
-        ).decode().strip().split('\n')[0]
-        subprocess.run(['xdotool', 'key', '--window', window_id, key], env={'DISPLAY': ':0'})
+        window_id = find_mpv_window()
+        subprocess.run(['xdotool', 'key', '--window', window_id] + [key] * repeat, env={'DISPLAY': ':0'})
+        if key in SHADER_JUMP_KEYS and state_snapshot:
+            shader = SHADER_JUMP_KEYS[key]
+            state_snapshot.update(shader=shader_order.index(shader) if shader in shader_order else SHADER_UNKNOWN)
+        return True
     except Exception as e:
         print(f"Failed to send key '{key}' to mpv: {e}")
+        return False
+
+def shader_cycle_order(shaders_dir=MPV_SHADERS_DIR):
+    """Entries in the c/z cycle: no shader, then each top-level shader sorted like Jinja's sort filter"""
+    shaders = [os.path.basename(p) for p in glob.glob(os.path.join(shaders_dir, "*.glsl"))]
+    return [""] + sorted(shaders, key=str.lower)
+
+def cycle_shader(step):
+    """Rotate the mpv shader ('c' forward, 'z' back) and remember where we are in the cycle"""
+    if send_key_to_mpv('c' if step > 0 else 'z') and state_snapshot:
+        if state_snapshot.shader != SHADER_UNKNOWN:
+            state_snapshot.update(shader=(state_snapshot.shader + step) % len(shader_order))
+
+def replay_shader(index, attempts=30, delay=2.0):
+    """After a restart mpv starts unshaded; step it back to the saved shader once its window exists"""
+    cycle = len(shader_order)
+    if index == SHADER_UNKNOWN or index >= cycle:
+        state_snapshot.update(shader=0)
+        return
+    # Shortest way round the cycle
+    if index <= cycle - index:
+        key, presses = 'c', index
+    else:
+        key, presses = 'z', cycle - index
+    if not presses:
+        return
+
+    def replay():
+        for _ in range(attempts):
+            if send_key_to_mpv(key, presses):
+                print(f"💾 Restored shader {shader_order[index]} ({presses}x '{key}')")
+                return
+            time.sleep(delay)
+        print("❌ Gave up restoring shader: no mpv window")
+        state_snapshot.update(shader=0)
+    threading.Thread(target=replay, daemon=True, name="shader-replay").start()
+
+def restore_channel(attempts=30, delay=2.0):
+    """After a warm restart the player comes back on its default station; once its mpv
+    window exists, queue a re-tune so it runs in order with any remote input since"""
+    def wait():
+        for _ in range(attempts):
+            try:
+                find_mpv_window()
+            except Exception:
+                time.sleep(delay)
+                continue
+            event_queue.put("RESTORE_CHANNEL")
+            return
+        print("❌ Gave up restoring channel: no mpv window")
+    threading.Thread(target=wait, daemon=True, name="channel-restore").start()
+
+def RESTORE_CHANNEL():
+    # Whatever is current now: anything dialed while the player was down never reached it
+    print(f"💾 Restoring channel {channel_dialer.current_channel}")
+    channel_dialer.tune_to_channel(channel_dialer.current_channel)
+
+def CLEAR_DIGITS():
+    print("⌛ Digit sequence went stale, discarding it")
+    channel_dialer.clear_queue()  # Digits that already ran must not tune on their own
 
 def CHANNEL_UP():
     print("📺 Channel UP!")
@@ -426,14 +1157,14 @@ def EFFECT_NEXT():
         display_controller.display_text("EFuP")
         # Use a timer to return to channel display after brief show
         threading.Timer(0.5, lambda: display_controller.display_number(channel_dialer.current_channel)).start()
-    send_key_to_mpv('c')
+    cycle_shader(1)
 
 def EFFECT_PREV():
     print("✨ Previous effect!")
     if display_controller:
         display_controller.display_text("EFdn")
         threading.Timer(0.5, lambda: display_controller.display_number(channel_dialer.current_channel)).start()
-    send_key_to_mpv('z')
+    cycle_shader(-1)
 
 def VOLUME_UP():
     print("🔊 Volume UP!")
@@ -537,13 +1268,22 @@ def UNMAPPED_EVENT(event_name):
 def UNKNOWN_EVENT(event_name):
     print(f"❌ Unknown event: {event_name}")
 
-def handle_event(event_name, protocol=None, address=None, command=None, verbose=False):
+def dispatch_event(event_name, *args, received=None):
+    """Event worker entry point: scheduler rules and remote events share one thread"""
+    if event_name == "SCHEDULED":
+        scheduler.execute(*args)
+    else:
+        handle_event(event_name, *args, received=received)
+
+def handle_event(event_name, protocol=None, address=None, command=None, verbose=False, received=None):
     if event_name.startswith("UNMAPPED_"):
         UNMAPPED_EVENT(event_name)
     elif event_name.startswith("UNKNOWN_"):
         UNKNOWN_EVENT(event_name)
     else:
         handler = globals().get(event_name)
+        if event_name.startswith("DIGIT_") and channel_dialer:
+            channel_dialer.set_remote(protocol, address, received)
         if handler and callable(handler):
             handler()
         else:
@@ -661,6 +1401,13 @@ def map_ir_signal(protocol, address, command):
                 return f"UNMAPPED_{remote_name}_{command}", protocol, address, command
     return f"UNKNOWN_{protocol}_{address}_{command}", protocol, address, command
 
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
 def setup_logging(log_to_file=False):
     if log_to_file:
         os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
@@ -671,7 +1418,7 @@ def setup_logging(log_to_file=False):
     return None
 
 def main():
-    global display_controller, channel_dialer
+    global display_controller, channel_dialer, event_queue, scheduler, state_snapshot, shader_order
     
     parser = argparse.ArgumentParser(description='Enhanced IR Remote Event Mapper with Channel Dialing and 7-Segment Display')
     parser.add_argument('--device', '-d', default='/dev/ttyACM0',
@@ -685,27 +1432,74 @@ def main():
     parser.add_argument('--debounce', '-t', type=float, default=0.7,
                         help='Debounce time in seconds')
     parser.add_argument('--digit-timeout', type=float, default=1.5,
-                        help='Timeout for digit sequence in seconds')
+                        help='Timeout for digit sequence in seconds (starting point until a remote has been learned)')
+    parser.add_argument('--digit-timeout-min', type=float, default=0.6,
+                        help='Lower bound for the learned digit timeout')
+    parser.add_argument('--digit-timeout-max', type=float, default=3.0,
+                        help='Upper bound for the learned digit timeout')
+    parser.add_argument('--cadence-path', default=CADENCE_PATH,
+                        help='File to persist learned per-remote digit cadence')
+    parser.add_argument('--fixed-digit-timeout', action='store_true',
+                        help='Always use --digit-timeout instead of learning it per remote')
     parser.add_argument('--log-to-file', action='store_true',
                         help='Log output to file instead of terminal')
     parser.add_argument('--verbose-unknowns', action='store_true',
                         help='Print protocol/address/command for unknown signals')
-    parser.add_argument('--display-brightness', type=int, default=7, choices=range(8),
-                        help='Initial display brightness (0-7)')
+    parser.add_argument('--display-brightness', type=int, default=None, choices=range(8),
+                        help='Initial display brightness (0-7, default: restored or 7)')
+    parser.add_argument('--queue-size', type=positive_int, default=16,
+                        help='Maximum events waiting for a handler before shedding')
+    parser.add_argument('--raw', action='store_true',
+                        help='Capture raw IR timings and decode them here (needs numpy), for remotes the Flipper cannot decode')
+    parser.add_argument('--record-raw', default=None,
+                        help='Append raw captures to this file (for ir_raw.py --benchmark)')
+    parser.add_argument('--confs-dir', default=CONFS_DIR,
+                        help='Station conf directory to read signoff events from')
+    parser.add_argument('--schedule-path', default=SCHEDULE_PATH,
+                        help='JSON file with user schedule rules (brightness, tune, display_off/on)')
+    parser.add_argument('--no-scheduler', action='store_true',
+                        help='Disable timed automation')
+    parser.add_argument('--state-path', default=STATE_PATH,
+                        help='Snapshot file for warm restarts (channel, brightness, shader)')
+    parser.add_argument('--mpv-shaders-dir', default=MPV_SHADERS_DIR,
+                        help='mpv shader directory, to know the order of the c/z cycle')
     args = parser.parse_args()
 
+    shader_order = shader_cycle_order(args.mpv_shaders_dir)
+
+    # Restore state before any serial device is touched
+    state_snapshot = StateSnapshot(args.state_path)
+    warm = state_snapshot.open()
+    brightness = args.display_brightness if args.display_brightness is not None else state_snapshot.brightness
+
     # Initialize display controller
-    display_controller = DisplayController(args.display_device, args.display_baud)
+    display_controller = DisplayController(args.display_device, args.display_baud,
+                                           state=state_snapshot, self_test=not warm)
     if display_controller.display_serial:
-        display_controller.set_brightness(args.display_brightness)
+        display_controller.set_brightness(brightness)
         display_controller.turn_on()
 
+    # Learn digit timeout per remote unless pinned
+    cadence = None
+    if not args.fixed_digit_timeout:
+        cadence = DigitCadence(default_timeout=args.digit_timeout,
+                               min_timeout=args.digit_timeout_min,
+                               max_timeout=args.digit_timeout_max,
+                               path=args.cadence_path)
+
     # Initialize channel dialer with display
-    channel_dialer = ChannelDialer(digit_timeout=args.digit_timeout, display_controller=display_controller)
-    
+    channel_dialer = ChannelDialer(digit_timeout=args.digit_timeout, display_controller=display_controller,
+                                   cadence=cadence, state=state_snapshot)
+
+    if warm:
+        # Warm restart: show the saved channel at once and skip the animation. stop.sh kills
+        # the player too, so it's re-tuned by restore_channel once it is running again.
+        display_controller.display_number(channel_dialer.current_channel)
+        replay_shader(state_snapshot.shader)
+
     # Boot sequence
     # Show initial channel on display (at end)
-    if display_controller.display_serial:
+    elif display_controller.display_serial:
         display_controller.display_text("----")
         time.sleep(0.8)
         display_controller.display_text("ACId")
@@ -718,6 +1512,18 @@ def main():
 
     log_file = setup_logging(args.log_to_file)
 
+    raw_parser = raw_decoder = raw_record = None
+    if args.raw:
+        try:
+            import ir_raw
+        except ImportError as e:
+            print(f"❌ Raw capture mode unavailable: {e}")
+            return
+        raw_parser = ir_raw.RawCaptureParser()
+        raw_decoder = ir_raw.RawDecoder()
+        if args.record_raw:
+            raw_record = open(args.record_raw, 'a')
+
     last_event = None
     last_event_time = 0
 
@@ -731,16 +1537,35 @@ def main():
         time.sleep(1)
         flipper.flushInput()
 
-        flipper.write(b'ir rx\r\n')
+        flipper.write(b'ir rx raw\r\n' if args.raw else b'ir rx\r\n')
         print(f"Enhanced IR Remote Mapper ready on {args.device}...")
         print(f"Writing JSON to: {SOCKET_PATH}")
         print(f"Valid channels: {VALID_CHANNELS}")
         print(f"Current channel: {channel_dialer.current_channel}")
-        print(f"Channel digit timeout: {args.digit_timeout}s")
+        if cadence:
+            print(f"Channel digit timeout: adaptive {args.digit_timeout_min}-{args.digit_timeout_max}s "
+                  f"(default {args.digit_timeout}s)")
+        else:
+            print(f"Channel digit timeout: {args.digit_timeout}s")
         if display_controller.display_serial:
             print(f"📟 Display: {args.display_device} @ {args.display_baud} baud")
         print("📺 Ready for channel dialing and Easter eggs!")
 
+        # Handlers sleep for display feedback; run them off the read loop so
+        # the serial buffer never backs up into a burst of old presses
+        event_queue = EventQueue(maxsize=args.queue_size, sequence_gap=args.digit_timeout_max)
+        event_queue.start(dispatch_event)
+        if warm:
+            restore_channel()
+
+        if not args.no_scheduler:
+            scheduler = Scheduler(channel_dialer, display_controller,
+                                  confs_dir=args.confs_dir, rules_path=args.schedule_path,
+                                  dispatch=lambda rule: event_queue.put("SCHEDULED", rule))
+            scheduler.start()
+            # Edit the rules or confs, then `pkill -HUP -f flipper_ir_remote` to apply
+            signal.signal(signal.SIGHUP, scheduler.request_reload)
+
         while True:
             line = flipper.readline().decode('utf-8').strip()
             if not line:
@@ -749,19 +1574,31 @@ def main():
                 print(f"DEBUG: '{line}'")
             if any(line.startswith(h) for h in ('ir rx', 'Receiving', 'Press Ctrl+C')):
                 continue
-            ir_match = re.match(r'(\w+), A:(0x[0-9A-Fa-f]+), C:(0x[0-9A-Fa-f]+)', line)
-            if ir_match:
-                protocol, address, command = ir_match.groups()
+            if raw_parser:
+                if raw_record:
+                    raw_record.write(line + '\n')
+                    raw_record.flush()
+                capture = raw_parser.feed(line)
+                signals = raw_decoder.decode([capture]) if capture is not None else []
+            else:
+                ir_match = re.match(r'(\w+), A:(0x[0-9A-Fa-f]+), C:(0x[0-9A-Fa-f]+)', line)
+                signals = [ir_match.groups()] if ir_match else []
+
+            for protocol, address, command in signals:
                 event, proto, addr, cmd = map_ir_signal(protocol, address, command)
                 current_time = time.time()
 
                 if event != last_event or (current_time - last_event_time) >= args.debounce:
-                    handle_event(event, proto, addr, cmd, args.verbose_unknowns)
+                    event_queue.put(event, proto, addr, cmd, args.verbose_unknowns, received=current_time)
                     last_event = event
                     last_event_time = current_time
 
     except KeyboardInterrupt:
         print("\nMapper stopped")
+        if event_queue:
+            event_queue.log_stats()
+        if scheduler:
+            scheduler.stop()
         channel_dialer.clear_queue()  # Clean up any pending timers
         if display_controller and display_controller.display_serial:
             display_controller.display_text("BYE")
@@ -779,6 +1616,9 @@ def main():
                 display_controller.display_serial.close()
         except:
             pass
+        if raw_record:
+            raw_record.close()
+        state_snapshot.close()
         if log_file:
             log_file.close()
 
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Raw IR Decoder - Decodes Flipper `ir rx raw` mark/space timings with NumPy
+Matches NEC/Samsung32/SIRC/RC5/RC6 in batch and fingerprints anything else,
+yielding the same (protocol, address, command) keys as the Flipper's own decoder
+"""
+
+import argparse
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+# Relative timing tolerance for matching a pulse against a template
+TOLERANCE = 0.3
+# A space this long (µs) ends a frame; repeats arrive as separate frames
+FRAME_GAP_US = 10000
+# Frames shorter than this are noise, not worth fingerprinting
+MIN_FINGERPRINT_LEN = 8
+
+RAW_HEADER = re.compile(r'RAW, (\d+) samples:')
+
+def _near(values, target):
+    """Vectorized tolerance check"""
+    return np.abs(values - target) <= target * TOLERANCE
+
+def _hex(value, bits):
+    """Format like the Flipper CLI: uppercase, zero-padded to the field width"""
+    return f"0x{int(value):0{max(2, (bits + 3) // 4)}X}"
+
+def _lsb_weights(nbits):
+    return np.left_shift(np.uint64(1), np.arange(nbits, dtype=np.uint64))
+
+def _msb_to_int(bits):
+    return int(bits.astype(np.int64) @ (1 << np.arange(len(bits) - 1, -1, -1)))
+
+def split_frames(timings):
+    """Split one capture into frames on long spaces (spaces sit at odd indices)"""
+    timings = np.asarray(timings, dtype=np.float64)
+    gaps = np.flatnonzero(timings[1::2] > FRAME_GAP_US) * 2 + 1
+    frames = []
+    start = 0
+    for gap in gaps:
+        frames.append(timings[start:gap])
+        start = gap + 1
+    frames.append(timings[start:])
+    return [f for f in frames if len(f)]
+
+def _pad(frames):
+    """Stack frames into a zero-padded (n, max_len) matrix for batch matching"""
+    lens = np.array([len(f) for f in frames], dtype=np.int64)
+    # At least 3 columns so the NEC repeat check can always index the row
+    matrix = np.zeros((len(frames), max(3, lens.max(initial=0))))
+    for i, frame in enumerate(frames):
+        matrix[i, :len(frame)] = frame
+    return matrix, lens
+
+def _match_pulse_distance(matrix, lens, leader_mark, leader_space, nbits=32, mark=560, one=1690):
+    """Batch-match pulse-distance frames (NEC family); returns (ok mask, LSB-first values)"""
+    need = 2 + 2 * nbits + 1
+    ok = lens == need
+    if not ok.any():
+        return ok, np.zeros(len(lens), dtype=np.uint64)
+    rows = matrix[:, :need]
+    marks = rows[:, 2::2]
+    spaces = rows[:, 3:need - 1:2]
+    ok &= _near(rows[:, 0], leader_mark) & _near(rows[:, 1], leader_space)
+    ok &= _near(marks, mark).all(axis=1)
+    ok &= (_near(spaces, mark) | _near(spaces, one)).all(axis=1)
+    bits = spaces > (mark + one) / 2
+    values = (bits.astype(np.uint64) * _lsb_weights(nbits)).sum(axis=1, dtype=np.uint64)
+    return ok, values
+
+def _match_sirc(matrix, lens):
+    """Batch-match Sony SIRC 12/15/20-bit frames; returns list of (ok mask, values, nbits)"""
+    results = []
+    for nbits in (12, 15, 20):
+        need = 2 + 2 * nbits - 1  # Final space is swallowed by the frame gap
+        ok = lens == need
+        if not ok.any():
+            continue
+        rows = matrix[:, :need]
+        marks = rows[:, 2::2]
+        spaces = rows[:, 3::2]
+        ok &= _near(rows[:, 0], 2400) & _near(rows[:, 1], 600)
+        ok &= (_near(marks, 600) | _near(marks, 1200)).all(axis=1)
+        ok &= _near(spaces, 600).all(axis=1)
+        bits = marks > 900
+        values = (bits.astype(np.uint64) * _lsb_weights(nbits)).sum(axis=1, dtype=np.uint64)
+        results.append((ok, values, nbits))
+    return results
+
+def _manchester_levels(timings, unit, max_run):
+    """Expand mark/space timings into per-half-bit levels (True = mark), or None"""
+    units = np.rint(timings / unit).astype(np.int64)
+    if len(units) == 0 or units.min() < 1 or units.max() > max_run:
+        return None
+    if not (np.abs(timings - units * unit) <= units * unit * TOLERANCE).all():
+        return None
+    return np.repeat(np.arange(len(units)) % 2 == 0, units)
+
+def _decode_rc5(frame):
+    """RC5/RC5X: 14 Manchester bits of 889µs halves, 1 = space then mark"""
+    levels = _manchester_levels(frame, 889, 2)
+    if levels is None:
+        return None
+    # First half of the start bit is idle and never captured; trailing space likewise
+    levels = np.concatenate(([False], levels))
+    if len(levels) > 28:
+        return None
+    levels = np.pad(levels, (0, 28 - len(levels)))
+    first, second = levels[0::2], levels[1::2]
+    if (first == second).any() or not second[0]:
+        return None
+    bits = second
+    address = _msb_to_int(bits[3:8])
+    command = _msb_to_int(bits[8:14])
+    if not bits[1]:
+        # RC5X reuses the inverted second start bit as command bit 6
+        return ("RC5X", _hex(address, 5), _hex(command | 0x40, 7))
+    return ("RC5", _hex(address, 5), _hex(command, 6))
+
+def _decode_rc6(frame):
+    """RC6 mode 0: 6T/2T leader, start bit, 3 mode bits, 2T trailer, 16 data bits (T = 444µs)"""
+    if len(frame) < 4 or not (_near(frame[0], 2666) and _near(frame[1], 889)):
+        return None
+    levels = _manchester_levels(frame[2:], 444, 3)
+    if levels is None or len(levels) > 44:
+        return None
+    levels = np.pad(levels, (0, 44 - len(levels)))
+    # Start bit and mode bits are 1T halves, trailer 2T halves, data 1T halves; 1 = mark then space
+    firsts = np.concatenate(([0, 2, 4, 6], np.arange(12, 44, 2)))
+    if (levels[firsts] == levels[firsts + 1]).any() or levels[8] == levels[10]:
+        return None
+    bits = levels[firsts]
+    if not bits[0] or bits[1:4].any():
+        return None  # Only mode 0 is used by consumer remotes
+    data = bits[4:]
+    return ("RC6", _hex(_msb_to_int(data[:8]), 8), _hex(_msb_to_int(data[8:]), 8))
+
+def fingerprint(frame):
+    """Key an unknown protocol by clustering its pulse widths.
+    Address identifies the timing family (same remote), command the symbol sequence (button)."""
+    ordered = np.sort(frame)
+    breaks = np.flatnonzero(ordered[1:] > ordered[:-1] * (1 + TOLERANCE)) + 1
+    edges = ordered[breaks]
+    symbols = np.searchsorted(edges, frame, side='right').astype(np.uint8)
+    # Structure only (width classes, length, leader), so timing jitter can't change the family
+    family = bytes([len(edges) + 1]) + len(frame).to_bytes(2, 'little') + symbols[:2].tobytes()
+    address = zlib.crc32(family) & 0xFFFF
+    command = zlib.crc32(symbols.tobytes())
+    return ("RAW", _hex(address, 16), _hex(command, 32))
+
+class RawDecoder:
+    """Decodes batches of raw captures into (protocol, address, command) tuples"""
+
+    def __init__(self):
+        self.last_nec = None  # NEC repeat frames carry no data of their own
+
+    def decode(self, captures):
+        """Decode a list of timing arrays; returns one tuple per recognized frame, in order"""
+        frames = [frame for capture in captures for frame in split_frames(capture)]
+        if not frames:
+            return []
+        matrix, lens = _pad(frames)
+        results = [None] * len(frames)
+
+        ok, values = _match_pulse_distance(matrix, lens, 9000, 4500)
+        for i in np.flatnonzero(ok):
+            results[i] = self._nec(int(values[i]))
+
+        ok, values = _match_pulse_distance(matrix, lens, 4500, 4500)
+        for i in np.flatnonzero(ok):
+            v = int(values[i])
+            address, address2, command, inverse = v & 0xFF, (v >> 8) & 0xFF, (v >> 16) & 0xFF, v >> 24
+            if address == address2 and command ^ inverse == 0xFF:
+                results[i] = ("Samsung32", _hex(address, 8), _hex(command, 8))
+
+        for ok, values, nbits in _match_sirc(matrix, lens):
+            for i in np.flatnonzero(ok):
+                v = int(values[i])
+                name = "SIRC" if nbits == 12 else f"SIRC{nbits}"
+                results[i] = (name, _hex(v >> 7, nbits - 7), _hex(v & 0x7F, 7))
+
+        repeat = (lens == 3) & _near(matrix[:, 0], 9000) & _near(matrix[:, 1], 2250) & _near(matrix[:, 2], 560)
+
+        # Resolve in capture order so each repeat follows the NEC press before it
+        decoded = []
+        for i, frame in enumerate(frames):
+            result = results[i]
+            if repeat[i]:
+                result = self.last_nec
+            elif result is not None and result[0].startswith("NEC"):
+                self.last_nec = result
+            elif result is None:
+                result = _decode_rc6(frame) or _decode_rc5(frame)
+                if result is None and len(frame) >= MIN_FINGERPRINT_LEN:
+                    result = fingerprint(frame)
+            if result is not None:
+                decoded.append(result)
+        return decoded
+
+    def _nec(self, value):
+        """Split a 32-bit NEC word into NEC or NECext like the Flipper does"""
+        address, naddress = value & 0xFF, (value >> 8) & 0xFF
+        command, ncommand = (value >> 16) & 0xFF, value >> 24
+        if address ^ naddress == 0xFF and command ^ ncommand == 0xFF:
+            result = ("NEC", _hex(address, 8), _hex(command, 8))
+        elif command ^ ncommand == 0xFF:
+            result = ("NECext", _hex(value & 0xFFFF, 16), _hex(command, 8))
+        else:
+            result = ("NECext", _hex(value & 0xFFFF, 16), _hex(value >> 16, 16))
+        return result
+
+class RawCaptureParser:
+    """Reassembles `RAW, N samples:` blocks from the Flipper CLI line by line"""
+
+    def __init__(self):
+        self.expected = 0
+        self.samples = []
+
+    def feed(self, line):
+        """Feed one serial line; returns a complete timing array or None"""
+        header = RAW_HEADER.search(line)
+        if header:
+            self.expected = int(header.group(1))
+            self.samples = []
+            return None
+        if not self.expected:
+            return None
+        self.samples.extend(int(tok) for tok in line.split() if tok.isdigit())
+        if len(self.samples) >= self.expected:
+            capture = np.array(self.samples[:self.expected], dtype=np.float64)
+            self.expected = 0
+            self.samples = []
+            return capture
+        return None
+
+def load_captures(path):
+    """Read recorded Flipper raw output (e.g. from the mapper's --record-raw)"""
+    parser = RawCaptureParser()
+    captures = []
+    with open(path) as f:
+        for line in f:
+            capture = parser.feed(line.strip())
+            if capture is not None:
+                captures.append(capture)
+    return captures
+
+# Synthetic encoders, used by the benchmark when no recording is given
+def _encode_pulse_distance(leader, value, nbits=32):
+    timings = list(leader)
+    for i in range(nbits):
+        timings += [560, 1690 if (value >> i) & 1 else 560]
+    return timings + [560]
+
+def _encode_sirc(address, command, nbits=12):
+    value = command | (address << 7)
+    timings = [2400, 600]
+    for i in range(nbits):
+        timings += [1200 if (value >> i) & 1 else 600, 600]
+    return timings[:-1]
+
+def _manchester_timings(halves, unit):
+    """Collapse a half-bit level list into alternating mark/space durations starting on a mark"""
+    runs = []
+    level, count = halves[0], 0
+    for half in halves:
+        if half == level:
+            count += 1
+        else:
+            runs.append(count * unit)
+            level, count = half, 1
+    if level:
+        runs.append(count * unit)
+    return runs
+
+def _encode_rc5(address, command, toggle=0):
+    bits = [1, 1, toggle] + [(address >> i) & 1 for i in range(4, -1, -1)] + [(command >> i) & 1 for i in range(5, -1, -1)]
+    halves = [h for b in bits for h in ((0, 1) if b else (1, 0))]
+    return _manchester_timings(halves[1:], 889)
+
+def _encode_rc6(address, command, toggle=0):
+    halves = [1, 0] + [0, 1] * 3 + ([1, 1, 0, 0] if toggle else [0, 0, 1, 1])
+    for value in (address, command):
+        for i in range(7, -1, -1):
+            halves += [1, 0] if (value >> i) & 1 else [0, 1]
+    return [2666, 889] + _manchester_timings(halves, 444)
+
+def synthetic_captures(count, seed=42):
+    """Build a mixed set of captures with jitter, plus the expected decodes"""
+    rng = np.random.default_rng(seed)
+    nec_word = 0x32 | (0xCD << 8) | (0x11 << 16) | (0xEE << 24)
+    samsung_word = 0x07 | (0x07 << 8) | (0x12 << 16) | (0xED << 24)
+    templates = [
+        # NEC press followed by a repeat burst, as a held button produces
+        ([_encode_pulse_distance((9000, 4500), nec_word)] + [[9000, 2250, 560]] * 4,
+         [("NEC", "0x32", "0x11")] * 5),
+        ([_encode_pulse_distance((4500, 4500), samsung_word)], [("Samsung32", "0x07", "0x12")]),
+        ([_encode_sirc(0x01, 0x10)] * 3, [("SIRC", "0x01", "0x10")] * 3),
+        ([_encode_rc5(0x00, 0x20)], [("RC5", "0x00", "0x20")]),
+        ([_encode_rc6(0x00, 0x0C)], [("RC6", "0x00", "0x0C")]),
+    ]
+    captures, expected = [], []
+    for i in range(count):
+        frames, decodes = templates[i % len(templates)]
+        capture = []
+        for frame in frames:
+            if capture:
+                capture.append(40000)  # Inter-frame gap
+            capture.extend(frame)
+        capture = np.array(capture, dtype=np.float64)
+        captures.append(capture * rng.uniform(0.93, 1.07, len(capture)))
+        expected.extend(decodes)
+    return captures, expected
+
+def benchmark(captures, expected=None, batch=32, rounds=5):
+    """Time batch decoding and compare against the repeat-burst rate we must sustain"""
+    frames = sum(len(split_frames(c)) for c in captures)
+    best = float('inf')
+    decoded = []
+    for _ in range(rounds):
+        decoder = RawDecoder()
+        start = time.perf_counter()
+        decoded = []
+        for i in range(0, len(captures), batch):
+            decoded.extend(decoder.decode(captures[i:i + batch]))
+        best = min(best, time.perf_counter() - start)
+
+    rate = frames / best if best else float('inf')
+    print(f"🧮 {len(captures)} captures, {frames} frames decoded in {best * 1000:.1f}ms "
+          f"({rate:,.0f} frames/s, batch {batch})")
+    # A held NEC button repeats every ~108ms; that is the stream we must keep up with
+    print(f"⏱️  Real-time headroom vs NEC repeat rate: {rate / (1 / 0.108):,.0f}x")
+    if expected is not None:
+        matches = sum(1 for got, want in zip(decoded, expected) if got == want)
+        print(f"✅ {matches}/{len(expected)} frames decoded as expected" if matches == len(expected) and
+              len(decoded) == len(expected) else
+              f"❌ {matches}/{len(expected)} frames matched ({len(decoded)} decoded)")
+        return matches == len(expected) and len(decoded) == len(expected)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode or benchmark Flipper raw IR captures')
+    parser.add_argument('captures', nargs='?',
+                        help='Recorded Flipper raw output (default: synthetic captures)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Time decoding instead of printing decoded signals')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Number of synthetic captures to benchmark')
+    parser.add_argument('--batch', type=int, default=32,
+                        help='Captures decoded per batch')
+    args = parser.parse_args()
+
+    if args.captures:
+        captures, expected = load_captures(args.captures), None
+    else:
+        captures, expected = synthetic_captures(args.count)
+
+    if args.benchmark:
+        return 0 if benchmark(captures, expected, batch=args.batch) else 1
+
+    decoder = RawDecoder()
+    for protocol, address, command in decoder.decode(captures):
+        print(f"{protocol}, A:{address}, C:{command}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Guide Asset Pre-renderer - Renders every image referenced by the station confs
+at the exact target resolution and pixel format, so the guide and standby
+screens never decode and rescale full-size PNGs at runtime
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+FS42_DIR = "/home/appuser/FieldStation42"
+CONFS_DIR = os.path.join(FS42_DIR, "confs")
+CACHE_DIR = "runtime/cache/prerender"  # relative to FS42_DIR, like the conf paths
+
+# Pixel format the player blits without conversion
+PIXEL_FORMAT = "rgb24"
+
+# Conf keys that hold image paths (lists or single strings)
+IMAGE_KEYS = ["images", "standby_image"]
+
+def source_hash(path):
+    """Hash the source image contents so edits invalidate the cache"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def load_confs(confs_dir):
+    """Load every station conf, returning (path, data) pairs"""
+    confs = []
+    for conf_path in sorted(glob.glob(os.path.join(confs_dir, "*.json"))):
+        try:
+            with open(conf_path) as f:
+                confs.append((conf_path, json.load(f)))
+        except Exception as e:
+            print(f"❌ Failed to read {conf_path}: {e}")
+    return confs
+
+def guide_size(confs):
+    """Resolution declared by the guide channel, if any"""
+    for _, data in confs:
+        station = data.get("station_conf", {})
+        if station.get("network_type") == "guide" and "width" in station and "height" in station:
+            return int(station["width"]), int(station["height"])
+    return None
+
+def target_size(station, default_size):
+    """Per-station render size, falling back to the guide resolution"""
+    if "width" in station and "height" in station:
+        return int(station["width"]), int(station["height"])
+    return default_size
+
+def render(source, dest, size):
+    """Scale (letterboxed, never stretched) and convert one image with ffmpeg"""
+    width, height = size
+    tmp = f"{dest}.tmp.png"
+    vf = (f"scale={width}:{height}:flags=lanczos:force_original_aspect_ratio=decrease,"
+          f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,format={PIXEL_FORMAT}")
+    try:
+        subprocess.run(
+            ['ffmpeg', '-loglevel', 'error', '-y', '-i', source,
+             '-vf', vf, '-pix_fmt', PIXEL_FORMAT,
+             # Uncompressed PNG is cheaper to decode than a smaller file is to read
+             '-compression_level', '0',
+             '-frames:v', '1', tmp],
+            check=True
+        )
+        os.replace(tmp, dest)  # Atomic, so a half-written file never looks cached
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render guide and standby images at their target resolution')
+    parser.add_argument('--root', default=FS42_DIR,
+                        help='FieldStation42 directory the conf paths are relative to')
+    parser.add_argument('--confs', default=None,
+                        help='Station conf directory (default: <root>/confs)')
+    parser.add_argument('--src', default=None,
+                        help='Pristine conf directory to deploy from (default: rewrite --confs in place)')
+    parser.add_argument('--default-size', default=None,
+                        help='WIDTHxHEIGHT for stations without their own size (default: guide resolution)')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='Parallel render jobs')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what would be rendered without touching anything')
+    args = parser.parse_args()
+
+    confs_dir = args.confs or os.path.join(args.root, "confs")
+    src_dir = args.src or confs_dir
+    confs = load_confs(src_dir)
+
+    default_size = guide_size(confs)
+    if args.default_size:
+        w, h = args.default_size.lower().split('x')
+        default_size = (int(w), int(h))
+
+    cache_dir = os.path.join(args.root, CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Collect every (source, size) pair and the rewrite each conf needs
+    jobs = {}       # cached rel path -> (abs source, abs dest, size)
+    rewrites = {}   # conf path -> {original rel path: cached rel path}
+    for conf_path, data in confs:
+        station = data.get("station_conf", {})
+        size = target_size(station, default_size)
+        if not size:
+            continue
+        for key in IMAGE_KEYS:
+            value = station.get(key)
+            paths = value if isinstance(value, list) else [value] if value else []
+            for rel in paths:
+                if rel.startswith(CACHE_DIR):
+                    continue  # Already points at a cached render
+                source = os.path.join(args.root, rel)
+                if not os.path.isfile(source):
+                    print(f"⚠️  Missing image {rel} in {os.path.basename(conf_path)}")
+                    continue
+                cached = f"{CACHE_DIR}/{source_hash(source)}_{size[0]}x{size[1]}.png"
+                jobs[cached] = (source, os.path.join(args.root, cached), size)
+                rewrites.setdefault(conf_path, {})[rel] = cached
+
+    pending = {k: v for k, v in jobs.items() if not os.path.isfile(v[1])}
+    print(f"🖼️  {len(jobs)} images referenced, {len(pending)} to render")
+
+    rendered = failed = 0
+    if pending and not args.dry_run:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            futures = {pool.submit(render, *job): cached for cached, job in pending.items()}
+            for future, cached in futures.items():
+                try:
+                    future.result()
+                    rendered += 1
+                    print(f"✅ Rendered {cached}")
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️  Failed to render {cached}: {e}")
+                    # Not fatal: leave the conf pointing at the original so the station still works
+                    for mapping in rewrites.values():
+                        for rel, target in list(mapping.items()):
+                            if target == cached:
+                                del mapping[rel]
+
+    # Deploy each conf, only touching files whose content actually changes so reruns settle
+    rewritten = 0
+    for conf_path, data in confs:
+        if args.dry_run:
+            break
+        mapping = rewrites.get(conf_path)
+        if mapping:
+            station = data["station_conf"]
+            for key in IMAGE_KEYS:
+                value = station.get(key)
+                if isinstance(value, list):
+                    station[key] = [mapping.get(p, p) for p in value]
+                elif value:
+                    station[key] = mapping.get(value, value)
+            content = json.dumps(data, indent=4) + "\n"
+        else:
+            with open(conf_path) as f:
+                content = f.read()
+
+        dest = os.path.join(confs_dir, os.path.basename(conf_path))
+        if os.path.isfile(dest):
+            with open(dest) as f:
+                if f.read() == content:
+                    continue
+        os.makedirs(confs_dir, exist_ok=True)
+        with open(dest, 'w') as f:
+            f.write(content)
+        rewritten += 1
+        print(f"📝 Deployed {os.path.basename(dest)}" + (" with cached image paths" if mapping else ""))
+
+    # Last line is parsed by the playbook to decide changed_when
+    print(f"prerender: rendered={rendered} cached={len(jobs) - len(pending)} "
+          f"failed={failed} rewritten={rewritten}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())